@@ -1,9 +1,11 @@
 """
 Optimized API Routes - Reduced redundancy
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
+import hmac
 import logging
-import math
+import os
+import numpy as np
 from typing import Optional, Dict, Any
 from api.papers.models import FilterRequest, PaperSummary, PaperDetail, PaginatedResponse, FilterOptions
 from services.papers.data_service import DataService
@@ -12,54 +14,72 @@ from services.papers.filter_service import FilterService
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/papers", tags=["papers"])
 
+# Handlers are plain `def`: they block on psycopg2 and pandas, so FastAPI
+# runs them in its threadpool instead of on the event loop.
+
 # Initialize services
 data_service = DataService()
 filter_service = FilterService()
 
 def _get_papers_data():
     """Helper: Get all papers with error handling"""
+    return _get_papers_snapshot()[0]
+
+def _get_papers_snapshot():
+    """Helper: Get all papers and their cache version with error handling"""
     try:
-        return data_service.get_all_papers()
+        return data_service.get_papers_snapshot()
     except Exception as e:
-        logger.error(f"Error getting papers data: {e}")
+        logger.error("Error getting papers data: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch papers data")
 
-def _create_paginated_response(papers_df, page: int, limit: int, filters_applied: Dict[str, Any] = None):
-    """Helper: Create paginated response from papers dataframe"""
-    if papers_df.empty:
-        return PaginatedResponse(
-            data=[], 
-            pagination={
-                "page": page, "limit": limit, "total": 0, "total_pages": 0, 
-                "has_next": False, "has_previous": False
-            },
-            filters_applied=filters_applied or {}
-        )
-    
-    # Apply pagination
-    total = len(papers_df)
-    total_pages = math.ceil(total / limit)
+def _collect_filters(study_types, phases, pharma_groups) -> Dict[str, Any]:
+    """Helper: Build the filters dict from the non-empty filter values"""
+    filters = {}
+    if study_types:
+        filters['study_types'] = study_types
+    if phases:
+        filters['phases'] = phases
+    if pharma_groups:
+        filters['pharma_groups'] = pharma_groups
+    return filters
+
+def _create_paginated_response(papers, rows, page: int, limit: int, filters_applied: Dict[str, Any] = None):
+    """Helper: Create paginated response from the selected rows of the papers columns"""
     start_idx = (page - 1) * limit
     end_idx = start_idx + limit
-    page_data = papers_df.iloc[start_idx:end_idx]
-    
-    # Format papers for list view
-    papers = []
-    for _, row in page_data.iterrows():
-        paper_data = data_service.format_paper(row, detail_view=False)
-        papers.append(PaperSummary(**paper_data))
+    papers_data = data_service.format_papers(papers, rows[start_idx:end_idx])
+    return _build_paginated_response(papers_data, len(rows), page, limit, filters_applied)
+
+def _query_paginated_response(filters: Dict[str, Any], page: int, limit: int):
+    """Helper: Create paginated response, filtering and paginating in SQL"""
+    resolved = filter_service.resolve_filters(filters)
+    total = data_service.count_papers(resolved)
+    rows = data_service.query_papers(resolved, (page - 1) * limit, limit)
+    papers_data = [data_service.format_paper(row, detail_view=False) for row in rows]
+    return _build_paginated_response(papers_data, total, page, limit, filters)
+
+def _pagination(page: int, limit: int, total: int) -> Dict[str, Any]:
+    """Helper: Pagination metadata (integer-only ceil for total_pages)"""
+    total_pages = -(-total // limit)
+    return {
+        "page": page, "limit": limit, "total": total, "total_pages": total_pages,
+        "has_next": page < total_pages, "has_previous": total > 0 and page > 1
+    }
+
+def _build_paginated_response(papers_data, total: int, page: int, limit: int, filters_applied: Dict[str, Any] = None):
+    """Helper: Create paginated response from one page of formatted papers"""
+    # Trusted data from our own DB + formatter, skip validation
+    papers = [PaperSummary.model_construct(**paper_data) for paper_data in papers_data] if total else []
     
     return PaginatedResponse(
         data=papers,
-        pagination={
-            "page": page, "limit": limit, "total": total, "total_pages": total_pages,
-            "has_next": page < total_pages, "has_previous": page > 1
-        },
+        pagination=_pagination(page, limit, total),
         filters_applied=filters_applied or {}
     )
 
 @router.get("/health")
-async def health_check():
+def health_check():
     """Health check endpoint"""
     try:
         is_connected, message = data_service.test_connection()
@@ -70,88 +90,109 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+@router.post("/cache/invalidate")
+def invalidate_cache(x_admin_token: Optional[str] = Header(None)):
+    """Drop cached papers so the next request re-reads the database.
+    
+    Requires the X-Admin-Token header to match CACHE_ADMIN_TOKEN; the
+    endpoint is disabled (404) when that variable is unset.
+    """
+    admin_token = os.getenv("CACHE_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    data_service.invalidate_cache()
+    return {"status": "invalidated"}
+
 @router.get("/filter-options", response_model=FilterOptions)
-async def get_filter_options():
+def get_filter_options():
     """Get available filter options - dynamically extracted from data"""
     try:
-        all_papers = _get_papers_data()
-        options = filter_service.get_filter_options(all_papers)
+        if data_service.config.SQL_FILTERING:
+            codes, groups = data_service.get_filter_values()
+            return FilterOptions(**filter_service.build_filter_options(codes, groups))
+        
+        all_papers, version = _get_papers_snapshot()
+        options = filter_service.get_filter_options(all_papers, version)
         return FilterOptions(**options)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting filter options: {e}")
+        logger.error("Error getting filter options: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get filter options")
 
 @router.get("/", response_model=PaginatedResponse)
-async def get_papers(
+def get_papers(
     page: int = Query(1, ge=1), 
     limit: int = Query(15, ge=1, le=100)
 ):
     """Get papers with pagination"""
+    if data_service.config.SQL_FILTERING:
+        return _query_paginated_response({}, page, limit)
+    
     all_papers = _get_papers_data()
-    return _create_paginated_response(all_papers, page, limit)
+    all_rows = np.arange(len(all_papers['work_id']))
+    return _create_paginated_response(all_papers, all_rows, page, limit)
 
 @router.post("/filter", response_model=PaginatedResponse)
-async def filter_papers(request: FilterRequest):
+def filter_papers(request: FilterRequest):
     """Filter papers with pagination"""
     try:
-        all_papers = _get_papers_data()
+        filters = _collect_filters(request.study_types, request.phases, request.pharma_groups)
         
-        # Prepare filters (exclude pagination fields)
-        filters = {
-            k: v for k, v in request.dict().items() 
-            if k not in ['page', 'limit'] and v
-        }
+        if data_service.config.SQL_FILTERING:
+            return _query_paginated_response(filters, request.page, request.limit)
+        
+        all_papers, version = _get_papers_snapshot()
         
         # Apply filters
-        filtered_papers = filter_service.apply_filters(all_papers, filters)
+        rows = filter_service.apply_filters(all_papers, filters, version)
         
-        return _create_paginated_response(filtered_papers, request.page, request.limit, filters)
+        return _create_paginated_response(all_papers, rows, request.page, request.limit, filters)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error filtering papers: {e}")
+        logger.error("Error filtering papers: %s", e)
         raise HTTPException(status_code=500, detail="Failed to filter papers")
 
 @router.get("/count", response_model=dict)
-async def get_papers_count(
+def get_papers_count(
     study_types: Optional[list] = Query(None),
     phases: Optional[list] = Query(None), 
     pharma_groups: Optional[list] = Query(None)
 ):
     """Get count of papers (total or filtered)"""
     try:
-        all_papers = _get_papers_data()
+        filters = _collect_filters(study_types, phases, pharma_groups)
+        
+        if data_service.config.SQL_FILTERING:
+            total = data_service.count_papers(filter_service.resolve_filters(filters))
+            return {"total": total, "filters_applied": filters} if filters else {"total": total}
+        
+        all_papers, version = _get_papers_snapshot()
         
         # If no filters provided, return total count
-        if not any([study_types, phases, pharma_groups]):
-            return {"total": len(all_papers)}
+        if not filters:
+            return {"total": len(all_papers['work_id'])}
         
         # Apply filters and return filtered count
-        filters = {}
-        if study_types:
-            filters['study_types'] = study_types
-        if phases:
-            filters['phases'] = phases
-        if pharma_groups:
-            filters['pharma_groups'] = pharma_groups
-            
-        filtered_papers = filter_service.apply_filters(all_papers, filters)
+        rows = filter_service.apply_filters(all_papers, filters, version)
         return {
-            "total": len(filtered_papers),
+            "total": len(rows),
             "filters_applied": filters
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting papers count: {e}")
+        logger.error("Error getting papers count: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get papers count")
 
 @router.get("/{work_id}", response_model=PaperDetail)
-async def get_paper_by_id(work_id: str):
+def get_paper_by_id(work_id: str):
     """Get paper details by ID"""
     try:
         paper_row = data_service.get_paper_by_id(work_id)
@@ -161,10 +202,10 @@ async def get_paper_by_id(work_id: str):
         
         # Format paper for detail view
         paper_data = data_service.format_paper(paper_row, detail_view=True)
-        return PaperDetail(**paper_data)
+        return PaperDetail.model_construct(**paper_data)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting paper: {e}")
+        logger.error("Error getting paper: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get paper")
\ No newline at end of file
@@ -1,6 +1,7 @@
 """
 Simple FastAPI Main Application
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
@@ -9,6 +10,7 @@ from datetime import datetime
 
 # Import routers
 from api.papers.routes import router as papers_router
+from config.database import close_pool
 
 # Setup basic logging
 logging.basicConfig(
@@ -18,18 +20,25 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release pooled database connections on shutdown"""
+    yield
+    close_pool()
+
 # Create FastAPI app
 app = FastAPI(
     title="SLR Backend APIs",
     description="Backend APIs for Systematic Literature Review",
     version="1.0.0",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Add CORS middleware (comma-separated CORS_ORIGINS; pin it in production)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure for production
+    allow_origins=[origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",")],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -63,12 +72,19 @@ if __name__ == "__main__":
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", 8000))
     debug = os.getenv("DEBUG_MODE", "false").lower() == "true"
+    # Each worker holds its own papers cache and up to DB_POOL_MAX connections,
+    # so scale API_WORKERS with care (reload mode only supports one)
+    workers = 1 if debug else int(os.getenv("API_WORKERS", 1))
     
-    logger.info(f"Starting server on {host}:{port}")
+    logger.info("Starting server on %s:%s with %d worker(s)", host, port, workers)
     
+    # "auto" picks uvloop/httptools when installed (uvicorn[standard])
     uvicorn.run(
         "app:app",
         host=host,
         port=port,
-        reload=debug
+        reload=debug,
+        workers=workers,
+        loop=os.getenv("API_LOOP", "auto"),
+        http=os.getenv("API_HTTP", "auto")
     )
\ No newline at end of file
@@ -2,6 +2,10 @@
 Simple Database Configuration
 """
 import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+from psycopg2 import pool
 
 class DatabaseConfig:
     """Simple database configuration"""
@@ -16,6 +20,13 @@ class DatabaseConfig:
     # Table settings
     TABLE = os.getenv("DB_TABLE", "ibd_rcts")
     
+    # Filter/paginate in SQL (requires migrations/001_ibd_rcts_filter_columns.sql)
+    SQL_FILTERING = os.getenv("DB_SQL_FILTERING", "false").lower() == "true"
+    
+    # Connection pool settings
+    POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+    POOL_MAX = int(os.getenv("DB_POOL_MAX", 16))
+    
     def get_psycopg2_params(self):
         """Get psycopg2 connection parameters"""
         return {
@@ -24,4 +35,50 @@ class DatabaseConfig:
             'user': self.USER,
             'password': self.PASSWORD,
             'database': self.DATABASE
-        }
\ No newline at end of file
+        }
+    
+    def get_connection_url(self):
+        """Get postgresql:// connection URL (used by connectorx)"""
+        return (
+            f"postgresql://{quote(self.USER, safe='')}:{quote(self.PASSWORD, safe='')}"
+            f"@{self.HOST}:{self.PORT}/{quote(self.DATABASE, safe='')}"
+        )
+
+# Process-wide connection pool, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+# Request threads wait for a free connection instead of exhausting the pool
+_pool_slots = threading.BoundedSemaphore(DatabaseConfig.POOL_MAX)
+
+def get_pool():
+    """Get the shared psycopg2 connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = DatabaseConfig()
+                _pool = pool.ThreadedConnectionPool(
+                    config.POOL_MIN, config.POOL_MAX, **config.get_psycopg2_params()
+                )
+    return _pool
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection, returning it to the pool afterwards"""
+    with _pool_slots:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        try:
+            yield conn
+        finally:
+            # Broken connections are discarded instead of being reused
+            db_pool.putconn(conn, close=bool(conn.closed))
+
+def close_pool():
+    """Close all pooled connections"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -0,0 +1,23 @@
+-- Filter columns for ibd_rcts, parsed once from `output` at write time.
+-- Required when DB_SQL_FILTERING=true so filtering/pagination run in SQL.
+
+-- Distinct values of a quote-agnostic 'key': 'value' pair in output
+CREATE OR REPLACE FUNCTION slr_output_values(output TEXT, key TEXT)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT COALESCE(array_agg(DISTINCT m[1]), '{}')
+    FROM regexp_matches(output, '[''"]' || key || '[''"]:\s*[''"]([^''"]*)[''"]', 'g') AS m
+$$;
+
+-- Study type and phase codes share the 'code' key (RCT, CR, ..., P1..P4)
+ALTER TABLE ibd_rcts
+    ADD COLUMN IF NOT EXISTS codes TEXT[]
+        GENERATED ALWAYS AS (slr_output_values(output, 'code')) STORED,
+    ADD COLUMN IF NOT EXISTS pharma_groups TEXT[]
+        GENERATED ALWAYS AS (slr_output_values(output, 'group')) STORED;
+
+CREATE INDEX IF NOT EXISTS ibd_rcts_codes_gin ON ibd_rcts USING GIN (codes);
+CREATE INDEX IF NOT EXISTS ibd_rcts_pharma_groups_gin ON ibd_rcts USING GIN (pharma_groups);
+-- Matches the ORDER BY of SQL pagination; work_id keeps tied years in a stable order
+CREATE INDEX IF NOT EXISTS ibd_rcts_publication_year_work_id_idx ON ibd_rcts (publication_year DESC, work_id);
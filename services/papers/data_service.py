@@ -1,23 +1,135 @@
 """
 Simple Data Service - Database + Basic Formatting
 """
+import numpy as np
 import pandas as pd
-import psycopg2
 import logging
+from psycopg2.extras import RealDictCursor
+import os
 import re
-from config.database import DatabaseConfig
+import threading
+import time
+from config.database import DatabaseConfig, get_connection
+
+try:
+    import connectorx
+except ImportError:
+    connectorx = None
 
 logger = logging.getLogger(__name__)
 
+# Columns kept for every paper
+PAPER_COLUMNS = ('work_id', 'title', 'abstract', 'doi', 'authorships', 'publication_year', 'output')
+
 class DataService:
+    # Compiled once for text formatting
+    _TAG_RE = re.compile(r'<[^>]*>')
+    _SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?]) +')
+    
     def __init__(self):
         self.config = DatabaseConfig()
+        # In-process cache of the papers table (TTL in seconds, 0 disables):
+        # (papers columns, version, monotonic fetch time)
+        self._cache = None
+        self._cache_version = 0
+        self._cache_lock = threading.Lock()
+        self._ttl = int(os.getenv("PAPERS_CACHE_TTL", "300"))
     
     def get_all_papers(self):
+        """Get all papers - served from the in-process cache while fresh.
+        
+        Papers are held column-wise: a dict of column name -> NumPy object
+        array (NULLs as None), all of the same length. The arrays are shared
+        between requests; callers must not modify them in place.
+        """
+        return self.get_papers_snapshot()[0]
+    
+    def get_papers_snapshot(self):
+        """Get all papers with the cache version they belong to.
+        
+        The version changes on every cache refill, so results derived from
+        the papers can be memoized against it. It is None when the papers
+        were not cached (e.g. the query failed).
+        """
+        cached = self._fresh_cache()
+        if cached is not None:
+            return cached
+        
+        # Only one request refills a cold cache, the others wait for it
+        with self._cache_lock:
+            cached = self._fresh_cache()
+            if cached is not None:
+                return cached
+            
+            df = self._fetch_all_papers()
+            papers = self._to_columns(df)
+            if df.empty:
+                return papers, None
+            
+            self._cache_version += 1
+            self._cache = (papers, self._cache_version, time.monotonic())
+            return papers, self._cache_version
+    
+    def invalidate_cache(self):
+        """Drop cached papers so the next request re-reads the database.
+        
+        The cache lives in this process only; with several uvicorn workers
+        each one keeps (and must be invalidated for) its own copy.
+        """
+        with self._cache_lock:
+            self._cache = None
+        logger.info("Papers cache invalidated")
+    
+    def _fresh_cache(self):
+        """Return cached (papers, version) if still within the TTL, else None"""
+        cache = self._cache
+        if cache is not None and time.monotonic() - cache[2] < self._ttl:
+            return cache[0], cache[1]
+        return None
+    
+    def _to_columns(self, df):
+        """Convert fetched papers into column arrays, NULLs as None"""
+        papers = {}
+        for name in PAPER_COLUMNS:
+            if name in df.columns:
+                values = df[name].to_numpy(dtype=object, copy=True)
+                values[pd.isna(values)] = None
+            else:
+                values = np.full(len(df), None, dtype=object)
+            papers[name] = values
+        
+        # List-view author strings, formatted once per fill for the whole table
+        papers['authors'] = self._format_authors(papers['authorships'])
+        return papers
+    
+    def _format_authors(self, raw_auths):
+        """Vectorized _parse_authors over an authorships column"""
+        raw = pd.Series(raw_auths, dtype=object)
+        authors = raw.map(str, na_action='ignore').astype(object)
+        
+        # "A ; B;;C" -> "A, B, C": trim around separators, drop empty names
+        multi = raw.str.contains(';', regex=False, na=False)
+        joined = (
+            authors[multi]
+            .str.replace(r'\s*;\s*', ';', regex=True)
+            .str.replace(r';+', ';', regex=True)
+            .str.strip()
+            .str.strip(';')
+            .str.replace(';', ', ', regex=False)
+        )
+        authors[multi] = joined
+        
+        # Limit length
+        too_long = authors.str.len() > 200
+        authors[too_long] = authors[too_long].str.slice(0, 197) + "..."
+        
+        # Empty authorships have no authors
+        authors[~raw.astype(bool)] = None
+        return authors.to_numpy(dtype=object)
+    
+    def _fetch_all_papers(self):
         """Get all papers from database"""
         try:
-            conn = psycopg2.connect(**self.config.get_psycopg2_params())
-            
             query = """
                 SELECT work_id, title, abstract, doi, 
                        authorships, publication_year, output
@@ -26,21 +138,102 @@ class DataService:
                 ORDER BY publication_year DESC
             """
             
-            df = pd.read_sql(query, conn)
-            conn.close()
+            if connectorx is not None:
+                # Arrow-backed fetch, no per-row Python tuples
+                df = connectorx.read_sql(self.config.get_connection_url(), query, return_type="pandas")
+                # Nullable ints come back as Int64; match pd.read_sql (float64 with NaN)
+                if pd.api.types.is_extension_array_dtype(df['publication_year']):
+                    df['publication_year'] = df['publication_year'].astype('float64')
+            else:
+                with get_connection() as conn:
+                    df = pd.read_sql(query, conn)
             
-            logger.info(f"Fetched {len(df)} papers")
+            logger.info("Fetched %d papers", len(df))
             return df
             
         except Exception as e:
-            logger.error(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return pd.DataFrame()
     
-    def get_paper_by_id(self, work_id: str):
-        """Get single paper by ID"""
+    def query_papers(self, resolved_filters, offset, limit):
+        """Get one page of filtered papers as row dicts - filtering done in SQL.
+        
+        Uses a server-side cursor so memory is bounded by the page size,
+        and skips pandas since the page is only formatted row by row.
+        """
         try:
-            conn = psycopg2.connect(**self.config.get_psycopg2_params())
+            where, params = self._filter_clause(resolved_filters)
+            query = f"""
+                SELECT work_id, title, abstract, doi, 
+                       authorships, publication_year, output
+                FROM ibd_rcts 
+                WHERE {where}
+                ORDER BY publication_year DESC, work_id
+                LIMIT %s OFFSET %s
+            """
+            
+            with get_connection() as conn:
+                with conn.cursor(name="papers_page", cursor_factory=RealDictCursor) as cur:
+                    cur.itersize = limit
+                    cur.execute(query, params + [limit, offset])
+                    return cur.fetchall()
             
+        except Exception as e:
+            logger.error("Database error: %s", e)
+            return []
+    
+    def count_papers(self, resolved_filters):
+        """Count filtered papers - filtering done in SQL"""
+        try:
+            where, params = self._filter_clause(resolved_filters)
+            query = f"SELECT COUNT(*) FROM ibd_rcts WHERE {where}"
+            
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchone()[0]
+            
+        except Exception as e:
+            logger.error("Database error: %s", e)
+            return 0
+    
+    def get_filter_values(self):
+        """Get distinct codes and pharma groups present in the table"""
+        try:
+            query = """
+                SELECT DISTINCT unnest(codes), 'code' FROM ibd_rcts
+                WHERE title IS NOT NULL AND abstract IS NOT NULL
+                UNION
+                SELECT DISTINCT unnest(pharma_groups), 'group' FROM ibd_rcts
+                WHERE title IS NOT NULL AND abstract IS NOT NULL
+            """
+            
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    rows = cur.fetchall()
+            
+            codes = {value for value, kind in rows if kind == 'code'}
+            groups = {value for value, kind in rows if kind == 'group'}
+            return codes, groups
+            
+        except Exception as e:
+            logger.error("Database error: %s", e)
+            return set(), set()
+    
+    def _filter_clause(self, resolved_filters):
+        """Build the WHERE clause and params for resolved filters"""
+        clauses = ["title IS NOT NULL", "abstract IS NOT NULL"]
+        params = []
+        for key, column in (('study_codes', 'codes'), ('phase_codes', 'codes'), ('pharma_groups', 'pharma_groups')):
+            if key in resolved_filters:
+                clauses.append(f"{column} && %s::text[]")
+                params.append(list(resolved_filters[key]))
+        return " AND ".join(clauses), params
+    
+    def get_paper_by_id(self, work_id: str):
+        """Get single paper by ID as a row dict"""
+        try:
             query = """
                 SELECT work_id, title, abstract, doi, 
                        authorships, publication_year, output
@@ -48,15 +241,13 @@ class DataService:
                 WHERE work_id = %s
             """
             
-            df = pd.read_sql(query, conn, params=[work_id])
-            conn.close()
-            
-            if not df.empty:
-                return df.iloc[0]
-            return None
+            with get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(query, [work_id])
+                    return cur.fetchone()
             
         except Exception as e:
-            logger.error(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return None
     
     def format_paper(self, row, detail_view=False):
@@ -79,26 +270,46 @@ class DataService:
             paper["output"] = str(row.get('output', '')) if row.get('output') else None
         else:
             # Truncated abstract for list view
-            paper["abstract"] = self._truncate_abstract(str(row.get('abstract', '')))
+            paper["abstract"] = self._list_abstract(row.get('abstract', ''))
         
         return paper
     
+    def format_papers(self, papers, rows):
+        """Format selected papers for list view - column by column.
+        
+        `rows` (slice or row positions) selects from the papers columns.
+        Same output as format_paper(row) per row.
+        """
+        columns = {
+            "work_id": [str(work_id) for work_id in papers['work_id'][rows]],
+            "title": [self._clean_text(str(title)) for title in papers['title'][rows]],
+            "doi": [str(doi) if doi else None for doi in papers['doi'][rows]],
+            "authors": papers['authors'][rows].tolist(),
+            "publication_year": [int(year) if year else None for year in papers['publication_year'][rows]],
+            "abstract": [self._list_abstract(abstract) for abstract in papers['abstract'][rows]],
+        }
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+    
+    def _list_abstract(self, abstract):
+        """Clean once, then truncate an abstract for list view"""
+        abstract = str(abstract)
+        return self._truncate_abstract(self._clean_text(abstract)) if abstract else None
+    
     def _clean_text(self, text):
         """Remove HTML tags and clean text"""
         if not text:
             return ""
-        # Remove HTML tags
-        text = re.sub(r'<[^>]*>', '', str(text))
+        text = str(text)
+        # Remove HTML tags (skip the regex when there can't be any)
+        if '<' in text:
+            text = self._TAG_RE.sub('', text)
         # Clean whitespace
-        return ' '.join(text.split()).strip()
+        return ' '.join(text.split())
     
-    def _truncate_abstract(self, abstract):
-        """Truncate abstract to 3 sentences for list view"""
-        if not abstract:
-            return None
-        
-        clean_abstract = self._clean_text(abstract)
-        sentences = re.split(r'(?<=[.!?]) +', clean_abstract)
+    def _truncate_abstract(self, clean_abstract):
+        """Truncate an already cleaned abstract to 3 sentences for list view"""
+        # Splitting past the 4th sentence is wasted work
+        sentences = self._SENTENCE_SPLIT_RE.split(clean_abstract, maxsplit=3)
         
         if len(sentences) <= 3:
             return clean_abstract
@@ -130,8 +341,9 @@ class DataService:
     def test_connection(self):
         """Test database connection"""
         try:
-            conn = psycopg2.connect(**self.config.get_psycopg2_params())
-            conn.close()
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
             return True, "Database connection successful"
         except Exception as e:
             return False, f"Connection failed: {str(e)}"
\ No newline at end of file
@@ -1,166 +1,252 @@
 """
 Fixed Filter Service - Handles both single and double quotes
 """
-import pandas as pd
+import numpy as np
 import logging
 import re
+import threading
+from functools import lru_cache
+from services.papers.output_scanner import NUMBA_AVAILABLE, scan_pairs
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# Known codes: (code in output, display label, keyword selecting it in a filter)
+STUDY_TYPES = (
+    ("RCT", "Randomized Controlled Trial (RCT)", "RCT"),
+    ("CR", "Case Report (CR)", "Case Report"),
+    ("CS", "Case Series (CS)", "Case Series"),
+    ("XS", "Cross-Sectional Study (XS)", "Cross-Sectional"),
+    ("CCS", "Case-Control Study (CCS)", "Case-Control"),
+    ("COH", "Cohort Study (COH)", "Cohort"),
+    ("SR", "Systematic Review (SR)", "Systematic Review"),
+    ("MA", "Meta-Analysis (MA)", "Meta-Analysis"),
+)
+
+PHASES = (
+    ("P1", "Phase I (P1)", "Phase I"),
+    ("P2", "Phase II (P2)", "Phase II"),
+    ("P3", "Phase III (P3)", "Phase III"),
+    ("P4", "Phase IV (P4)", "Phase IV"),
+)
+
+PHARMA_GROUPS = (
+    "Medical Affairs",
+    "Commercial/Market Access",
+    "Pharmacovigilance",
+    "Clinical Development / R&D",
+    "Regulatory Affairs",
+    "HEOR (Health Economics)",
+)
+
+
+STUDY_CODES = frozenset(code for code, _, _ in STUDY_TYPES)
+PHASE_CODES = frozenset(code for code, _, _ in PHASES)
+
+# Quoted value following a matched key, e.g. `: 'RCT'` after `'code'`
+_VALUE_RE = re.compile(r"\s*['\"]([^'\"]*)['\"]")
+
+# Regex equivalent of the automaton; the lookahead keeps overlapping hits
+_PAIR_RE = re.compile(r"(?=['\"](code|group)['\"]:\s*['\"]([^'\"]*)['\"])")
+
+# One bit per known (key, value) pair: study types, then phases, then groups
+KNOWN_PAIRS = tuple(
+    [("code", code) for code, _, _ in STUDY_TYPES + PHASES]
+    + [("group", group) for group in PHARMA_GROUPS]
+)
+PAIR_BITS = {pair: np.uint32(1 << bit) for bit, pair in enumerate(KNOWN_PAIRS)}
+
+# (category, key in output) per scanned slot, in _scan() result order
+_SLOTS = (('study_codes', 'code'), ('phase_codes', 'code'), ('pharma_groups', 'group'))
+
+
+def _build_automaton():
+    """Aho-Corasick automaton over every quoting of `'code':` and `'group':`"""
+    automaton = ahocorasick.Automaton()
+    for key in ("code", "group"):
+        for opening in "'\"":
+            for closing in "'\"":
+                automaton.add_word(f"{opening}{key}{closing}:", key)
+    automaton.make_automaton()
+    return automaton
+
+
+def _build_selectors(entries):
+    """Word-bounded keyword patterns - "Phase I" must not select "Phase II" """
+    return tuple(
+        (re.compile(r"\b" + re.escape(keyword) + r"\b"), code) for code, _, keyword in entries
+    )
+
+
+def _as_text(outputs):
+    """Output column as str - NULLs become '', json/jsonb values are str()-ed"""
+    return [str(output) if output is not None else '' for output in outputs]
+
+
+@lru_cache(maxsize=1024)
+def _codes_for_label(selectors, label):
+    """Codes selected by a single filter label - labels repeat across requests"""
+    return frozenset(code for pattern, code in selectors if pattern.search(label))
+
+
 class FilterService:
-    def get_filter_options(self, df):
-        """Get available filter options from data"""
-        if df.empty or 'output' not in df.columns:
-            return {"study_types": [], "phases": [], "pharma_groups": []}
-        
-        study_types = set()
-        phases = set()
-        pharma_groups = set()
-        
-        for _, row in df.iterrows():
-            output = str(row.get('output', ''))
-            if output:
-                study_types.update(self._extract_study_types(output))
-                phases.update(self._extract_phases(output))
-                pharma_groups.update(self._extract_pharma_groups(output))
-        
-        return {
-            "study_types": sorted(list(study_types)),
-            "phases": sorted(list(phases)),
-            "pharma_groups": sorted(list(pharma_groups))
-        }
+    # Compiled once at import, shared by every instance and request
+    _AUTOMATON = _build_automaton() if ahocorasick else None
+    _STUDY_SELECTORS = _build_selectors(STUDY_TYPES)
+    _PHASE_SELECTORS = _build_selectors(PHASES)
     
-    def apply_filters(self, df, filters):
-        """Apply filters to papers"""
-        if df.empty or not filters:
-            return df
-        
-        filtered_indices = []
-        
-        for idx, row in df.iterrows():
-            output = str(row.get('output', ''))
-            if output and self._matches_filters(output, filters):
-                filtered_indices.append(idx)
-        
-        result = df.iloc[filtered_indices].copy() if filtered_indices else pd.DataFrame()
-        logger.info(f"Filtered {len(result)} papers from {len(df)} total")
-        return result
+    def __init__(self):
+        # (papers cache version, options) of the last computed filter options
+        self._filter_options_cache = None
+        # (papers cache version, per-row uint32 bitmask of KNOWN_PAIRS)
+        self._bits_cache = None
+        self._bits_lock = threading.Lock()
     
-    def _extract_study_types(self, output):
-        """Extract study types from output - handles both single and double quotes"""
-        types = []
-        
-        # Create patterns that match both single and double quotes
-        patterns = [
-            (r"['\"]code['\"]:\s*['\"]RCT['\"]", "Randomized Controlled Trial (RCT)"),
-            (r"['\"]code['\"]:\s*['\"]CR['\"]", "Case Report (CR)"),
-            (r"['\"]code['\"]:\s*['\"]CS['\"]", "Case Series (CS)"),
-            (r"['\"]code['\"]:\s*['\"]XS['\"]", "Cross-Sectional Study (XS)"),
-            (r"['\"]code['\"]:\s*['\"]CCS['\"]", "Case-Control Study (CCS)"),
-            (r"['\"]code['\"]:\s*['\"]COH['\"]", "Cohort Study (COH)"),
-            (r"['\"]code['\"]:\s*['\"]SR['\"]", "Systematic Review (SR)"),
-            (r"['\"]code['\"]:\s*['\"]MA['\"]", "Meta-Analysis (MA)")
-        ]
-        
-        for pattern, study_type in patterns:
-            if re.search(pattern, output):
-                types.append(study_type)
-        
-        return types
+    def get_filter_options(self, papers, version=None):
+        """Get available filter options from data - memoized per cache version"""
+        cached = self._filter_options_cache
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+        
+        # OR of every row's bits tells which known codes/groups occur at all
+        present = np.bitwise_or.reduce(self._row_bits(papers['output'], version), initial=np.uint32(0))
+        found = {value for (_, value), bit in PAIR_BITS.items() if present & bit}
+        options = self.build_filter_options(found, found)
+        if version is not None:
+            self._filter_options_cache = (version, options)
+        return options
     
-    def _extract_phases(self, output):
-        """Extract phases from output - handles both single and double quotes"""
-        phases = []
-        
-        patterns = [
-            (r"['\"]code['\"]:\s*['\"]P1['\"]", "Phase I (P1)"),
-            (r"['\"]code['\"]:\s*['\"]P2['\"]", "Phase II (P2)"),
-            (r"['\"]code['\"]:\s*['\"]P3['\"]", "Phase III (P3)"),
-            (r"['\"]code['\"]:\s*['\"]P4['\"]", "Phase IV (P4)")
-        ]
-        
-        for pattern, phase in patterns:
-            if re.search(pattern, output):
-                phases.append(phase)
-        
-        return phases
+    def apply_filters(self, papers, filters, version=None):
+        """Apply filters to papers - returns positions of the matching rows"""
+        total = len(papers['output'])
+        if not total or not filters:
+            return np.arange(total)
+        
+        bits = self._row_bits(papers['output'], version)
+        mask = np.ones(total, dtype=bool)
+        
+        for slot, key, values in self._conditions(self.resolve_filters(filters)):
+            wanted = np.uint32(0)
+            unknown = []
+            for value in values:
+                bit = PAIR_BITS.get((key, value))
+                if bit is None:
+                    unknown.append(value)
+                else:
+                    wanted |= bit
+            
+            matched = (bits & wanted) != 0
+            if unknown:
+                # Values outside the bitmask (e.g. an unlisted pharma group)
+                matched |= self._scan_mask(papers['output'], slot, key, unknown)
+            mask &= matched
+        
+        rows = np.flatnonzero(mask)
+        logger.info("Filtered %d papers from %d total", len(rows), total)
+        return rows
     
-    def _extract_pharma_groups(self, output):
-        """Extract pharma groups from output - handles both single and double quotes"""
-        groups = []
-        
-        patterns = [
-            (r"['\"]group['\"]:\s*['\"]Medical Affairs['\"]", "Medical Affairs"),
-            (r"['\"]group['\"]:\s*['\"]Commercial/Market Access['\"]", "Commercial/Market Access"),
-            (r"['\"]group['\"]:\s*['\"]Pharmacovigilance['\"]", "Pharmacovigilance"),
-            (r"['\"]group['\"]:\s*['\"]Clinical Development / R&D['\"]", "Clinical Development / R&D"),
-            (r"['\"]group['\"]:\s*['\"]Regulatory Affairs['\"]", "Regulatory Affairs"),
-            (r"['\"]group['\"]:\s*['\"]HEOR \(Health Economics\)['\"]", "HEOR (Health Economics)")
-        ]
-        
-        for pattern, group in patterns:
-            if re.search(pattern, output):
-                groups.append(group)
-        
-        return groups
+    def _row_bits(self, outputs, version):
+        """Per-row bitmask of KNOWN_PAIRS - computed once per cache version"""
+        if version is None:
+            return self._compute_bits(outputs)
+        
+        cached = self._bits_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        # Only one request scans a new cache version, the others wait for it
+        with self._bits_lock:
+            cached = self._bits_cache
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            
+            bits = self._compute_bits(outputs)
+            self._bits_cache = (version, bits)
+            return bits
     
-    def _matches_filters(self, output, filters):
-        """Check if output matches all filters"""
-        # Check study types
+    def _compute_bits(self, outputs):
+        """Scan the output column once, setting a bit per known pair found"""
+        outputs = _as_text(outputs)
+        
+        if NUMBA_AVAILABLE:
+            weights = np.array(list(PAIR_BITS.values()), dtype=np.uint32)
+            return scan_pairs(outputs, KNOWN_PAIRS).astype(np.uint32) @ weights
+        
+        bits = np.zeros(len(outputs), dtype=np.uint32)
+        for row, output in enumerate(outputs):
+            if not output:
+                continue
+            for slot, values in enumerate(self._scan(output)):
+                key = _SLOTS[slot][1]
+                for value in values:
+                    bit = PAIR_BITS.get((key, value))
+                    if bit is not None:
+                        bits[row] |= bit
+        return bits
+    
+    def _scan_mask(self, outputs, slot, key, values):
+        """Rows whose output holds any of the given values under key"""
+        outputs = _as_text(outputs)
+        
+        if NUMBA_AVAILABLE:
+            return scan_pairs(outputs, [(key, value) for value in values]).any(axis=1)
+        
+        wanted = set(values)
+        return np.fromiter(
+            (not self._scan(output)[slot].isdisjoint(wanted) for output in outputs),
+            dtype=bool, count=len(outputs)
+        )
+    
+    def resolve_filters(self, filters):
+        """Translate requested filter labels into the values stored in output"""
+        resolved = {}
         if filters.get('study_types'):
-            if not self._matches_study_types(output, filters['study_types']):
-                return False
-        
-        # Check phases
+            resolved['study_codes'] = self._selected_codes(self._STUDY_SELECTORS, filters['study_types'])
         if filters.get('phases'):
-            if not self._matches_phases(output, filters['phases']):
-                return False
-        
-        # Check pharma groups
+            resolved['phase_codes'] = self._selected_codes(self._PHASE_SELECTORS, filters['phases'])
         if filters.get('pharma_groups'):
-            if not self._matches_pharma_groups(output, filters['pharma_groups']):
-                return False
-        
-        return True
+            resolved['pharma_groups'] = list(filters['pharma_groups'])
+        return resolved
+    
+    def build_filter_options(self, codes, groups):
+        """Build filter options from the codes and groups present in the data"""
+        return {
+            "study_types": sorted(label for code, label, _ in STUDY_TYPES if code in codes),
+            "phases": sorted(label for code, label, _ in PHASES if code in codes),
+            "pharma_groups": sorted(group for group in PHARMA_GROUPS if group in groups)
+        }
     
-    def _matches_study_types(self, output, study_types):
-        """Check study type matches using regex"""
-        for study_type in study_types:
-            if 'RCT' in study_type and re.search(r"['\"]code['\"]:\s*['\"]RCT['\"]", output):
-                return True
-            if 'Case Report' in study_type and re.search(r"['\"]code['\"]:\s*['\"]CR['\"]", output):
-                return True
-            if 'Case Series' in study_type and re.search(r"['\"]code['\"]:\s*['\"]CS['\"]", output):
-                return True
-            if 'Cross-Sectional' in study_type and re.search(r"['\"]code['\"]:\s*['\"]XS['\"]", output):
-                return True
-            if 'Case-Control' in study_type and re.search(r"['\"]code['\"]:\s*['\"]CCS['\"]", output):
-                return True
-            if 'Cohort' in study_type and re.search(r"['\"]code['\"]:\s*['\"]COH['\"]", output):
-                return True
-            if 'Systematic Review' in study_type and re.search(r"['\"]code['\"]:\s*['\"]SR['\"]", output):
-                return True
-            if 'Meta-Analysis' in study_type and re.search(r"['\"]code['\"]:\s*['\"]MA['\"]", output):
-                return True
-        return False
+    def _scan(self, output):
+        """Single pass over output - returns (study codes, phase codes, pharma groups)"""
+        found = {"code": set(), "group": set()}
+        
+        if self._AUTOMATON is not None:
+            for end, key in self._AUTOMATON.iter(output):
+                match = _VALUE_RE.match(output, end + 1)
+                if match:
+                    found[key].add(match.group(1))
+        else:
+            for match in _PAIR_RE.finditer(output):
+                found[match.group(1)].add(match.group(2))
+        
+        codes = found["code"]
+        return codes & STUDY_CODES, codes & PHASE_CODES, found["group"]
     
-    def _matches_phases(self, output, phases):
-        """Check phase matches using regex"""
-        for phase in phases:
-            if 'Phase I' in phase and re.search(r"['\"]code['\"]:\s*['\"]P1['\"]", output):
-                return True
-            if 'Phase II' in phase and re.search(r"['\"]code['\"]:\s*['\"]P2['\"]", output):
-                return True
-            if 'Phase III' in phase and re.search(r"['\"]code['\"]:\s*['\"]P3['\"]", output):
-                return True
-            if 'Phase IV' in phase and re.search(r"['\"]code['\"]:\s*['\"]P4['\"]", output):
-                return True
-        return False
+    def _conditions(self, resolved):
+        """Turn resolved filters into (scan slot, output key, values), ORed per filter"""
+        return [
+            (slot, key, resolved[name])
+            for slot, (name, key) in enumerate(_SLOTS)
+            if name in resolved
+        ]
     
-    def _matches_pharma_groups(self, output, pharma_groups):
-        """Check pharma group matches using regex"""
-        for group in pharma_groups:
-            pattern = f"['\"]group['\"]:\s*['\"]" + re.escape(group) + "['\"]"
-            if re.search(pattern, output):
-                return True
-        return False
\ No newline at end of file
+    def _selected_codes(self, selectors, values):
+        """Resolve requested filter labels to the codes they select"""
+        selected = set()
+        for value in values:
+            selected |= _codes_for_label(selectors, value)
+        return [code for _, code in selectors if code in selected]
\ No newline at end of file
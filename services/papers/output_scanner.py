@@ -0,0 +1,125 @@
+"""
+Output Scanner - Numba-compiled scan for 'key': 'value' pairs in output
+"""
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    # The kernel is called from request threads; TBB first used off the main
+    # thread can hang interpreter exit, so prefer OpenMP when available
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+# Byte values used by the kernel
+_SINGLE_QUOTE = 39
+_DOUBLE_QUOTE = 34
+_COLON = 58
+
+# Non-ASCII characters matched by re's \s (str.isspace()), as UTF-8 byte sequences
+_UNICODE_SPACES = (
+    "\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a"
+    "\u2028\u2029\u202f\u205f\u3000"
+)
+
+
+def _pack(items):
+    """Pack strings into a flat uint8 buffer plus int64 offsets"""
+    encoded = [item.encode('utf-8') for item in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buf, offsets
+
+
+_SPACE_BUF, _SPACE_OFFSETS = _pack(_UNICODE_SPACES)
+
+
+def scan_pairs(outputs, pairs):
+    """Scan output strings for quote-agnostic key/value pairs.
+
+    Equivalent to searching each output for
+    ``['"]key['"]:\\s*['"]value['"]`` for every (key, value) in pairs.
+    Returns a bool array of shape (len(outputs), len(pairs)).
+    """
+    keys = sorted({key for key, _ in pairs})
+    key_buf, key_offsets = _pack(keys)
+    value_buf, value_offsets = _pack([value for _, value in pairs])
+    value_keys = np.array([keys.index(key) for key, _ in pairs], dtype=np.int64)
+    buf, offsets = _pack(outputs)
+    return _scan_rows(buf, offsets, key_buf, key_offsets, value_buf, value_offsets, value_keys,
+                      _SPACE_BUF, _SPACE_OFFSETS)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _is_quote(byte):
+        return byte == _SINGLE_QUOTE or byte == _DOUBLE_QUOTE
+
+    @njit(cache=True)
+    def _equals(buf, pos, end, needle, start, stop):
+        """Check buf[pos:] starts with needle[start:stop] within end"""
+        length = stop - start
+        if pos + length > end:
+            return False
+        for t in range(length):
+            if buf[pos + t] != needle[start + t]:
+                return False
+        return True
+
+    @njit(cache=True)
+    def _space_len(buf, pos, end, space_buf, space_offsets):
+        """Byte length of the \\s character at buf[pos], 0 if it is not one"""
+        byte = buf[pos]
+        if byte < 128:
+            # ASCII \s: \t, \n, \v, \f, \r, \x1c-\x1f and space
+            return 1 if (9 <= byte <= 13) or (28 <= byte <= 32) else 0
+        for s in range(space_offsets.shape[0] - 1):
+            if _equals(buf, pos, end, space_buf, space_offsets[s], space_offsets[s + 1]):
+                return space_offsets[s + 1] - space_offsets[s]
+        return 0
+
+    @njit(cache=True, parallel=True)
+    def _scan_rows(buf, offsets, key_buf, key_offsets, value_buf, value_offsets, value_keys,
+                   space_buf, space_offsets):
+        n_rows = offsets.shape[0] - 1
+        n_keys = key_offsets.shape[0] - 1
+        n_values = value_offsets.shape[0] - 1
+        hits = np.zeros((n_rows, n_values), dtype=np.bool_)
+
+        for row in prange(n_rows):
+            end = offsets[row + 1]
+            for i in range(offsets[row], end):
+                if not _is_quote(buf[i]):
+                    continue
+                for k in range(n_keys):
+                    # Opening quote, key, closing quote, colon
+                    j = i + 1
+                    if not _equals(buf, j, end, key_buf, key_offsets[k], key_offsets[k + 1]):
+                        continue
+                    j += key_offsets[k + 1] - key_offsets[k]
+                    if j + 1 >= end or not _is_quote(buf[j]) or buf[j + 1] != _COLON:
+                        continue
+                    j += 2
+                    # Optional whitespace, then the quoted value
+                    while j < end:
+                        step = _space_len(buf, j, end, space_buf, space_offsets)
+                        if not step:
+                            break
+                        j += step
+                    if j >= end or not _is_quote(buf[j]):
+                        continue
+                    j += 1
+                    for v in range(n_values):
+                        if value_keys[v] != k or hits[row, v]:
+                            continue
+                        stop = j + value_offsets[v + 1] - value_offsets[v]
+                        if (_equals(buf, j, end, value_buf, value_offsets[v], value_offsets[v + 1])
+                                and stop < end and _is_quote(buf[stop])):
+                            hits[row, v] = True
+
+        return hits
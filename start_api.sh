@@ -15,5 +15,6 @@ export PYTHONPATH="/home/sathyan/slr_mvp_build/slr_backend_apis"
 # Create logs directory if it doesn't exist
 mkdir -p logs
 
-# Start the API
-exec uvicorn app:app --host 0.0.0.0 --port 8000 --workers 1
+# Start the API ("auto" uses uvloop + httptools when uvicorn[standard] is installed).
+# Each worker has its own papers cache and DB pool; keep API_WORKERS small.
+exec uvicorn app:app --host 0.0.0.0 --port 8000 --workers "${API_WORKERS:-1}" --loop auto --http auto
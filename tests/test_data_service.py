@@ -0,0 +1,240 @@
+"""
+DataService tests - papers cache, SQL filtering and author formatting
+"""
+import itertools
+import random
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.papers import data_service
+from services.papers.data_service import DataService
+
+
+@pytest.fixture
+def service():
+    return DataService()
+
+
+class _Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(data_service, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def fetches(service, monkeypatch):
+    """Stub _fetch_all_papers; append a DataFrame (or an empty one for a failure) per fetch"""
+    results = []
+    calls = []
+    
+    def fetch_all_papers():
+        calls.append(1)
+        return results.pop(0)
+    
+    monkeypatch.setattr(service, "_fetch_all_papers", fetch_all_papers)
+    monkeypatch.setattr(service, "_ttl", 300)
+    return results, calls
+
+
+def _frame(*work_ids):
+    return pd.DataFrame({'work_id': list(work_ids), 'title': ['t'] * len(work_ids),
+                         'authorships': ['A; B'] * len(work_ids)})
+
+
+def test_cache_served_within_ttl(service, clock, fetches):
+    results, calls = fetches
+    results.append(_frame('w1', 'w2'))
+    
+    papers, version = service.get_papers_snapshot()
+    clock.now += 299
+    cached, cached_version = service.get_papers_snapshot()
+    
+    assert cached is papers and cached_version == version is not None
+    assert papers['work_id'].tolist() == ['w1', 'w2']
+    assert papers['authors'].tolist() == ['A, B', 'A, B']
+    assert len(calls) == 1
+
+
+def test_cache_refilled_after_ttl(service, clock, fetches):
+    results, calls = fetches
+    results += [_frame('w1'), _frame('w2')]
+    
+    _, version = service.get_papers_snapshot()
+    clock.now += 300
+    papers, new_version = service.get_papers_snapshot()
+    
+    assert papers['work_id'].tolist() == ['w2']
+    assert new_version == version + 1
+    assert len(calls) == 2
+
+
+def test_invalidate_cache_bumps_version(service, clock, fetches):
+    results, calls = fetches
+    results += [_frame('w1'), _frame('w1', 'w2')]
+    
+    _, version = service.get_papers_snapshot()
+    service.invalidate_cache()
+    papers, new_version = service.get_papers_snapshot()
+    
+    assert papers['work_id'].tolist() == ['w1', 'w2']
+    assert new_version == version + 1
+    assert len(calls) == 2
+
+
+def test_failed_fetch_not_cached(service, clock, fetches):
+    results, calls = fetches
+    results += [pd.DataFrame(), _frame('w1')]
+    
+    papers, version = service.get_papers_snapshot()
+    assert version is None and len(papers['work_id']) == 0
+    
+    papers, version = service.get_papers_snapshot()
+    assert version is not None and papers['work_id'].tolist() == ['w1']
+    assert len(calls) == 2
+
+
+def test_zero_ttl_disables_cache(service, clock, fetches, monkeypatch):
+    results, calls = fetches
+    results += [_frame('w1'), _frame('w1')]
+    monkeypatch.setattr(service, "_ttl", 0)
+    
+    _, version = service.get_papers_snapshot()
+    _, new_version = service.get_papers_snapshot()
+    assert new_version == version + 1
+    assert len(calls) == 2
+
+
+class _Cursor:
+    """Records executed SQL and returns canned rows"""
+    
+    def __init__(self, rows, executed):
+        self.rows = rows
+        self.executed = executed
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, query, params=None):
+        self.executed.append((' '.join(query.split()), params))
+    
+    def fetchall(self):
+        return self.rows
+    
+    def fetchone(self):
+        return self.rows[0]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Stub get_connection; set .rows for the next query, read .executed/.cursors"""
+    db = SimpleNamespace(rows=[], executed=[], cursors=[], error=None)
+    
+    class Connection:
+        def cursor(self, *args, **kwargs):
+            db.cursors.append(kwargs)
+            return _Cursor(db.rows, db.executed)
+    
+    @contextmanager
+    def get_connection():
+        if db.error:
+            raise db.error
+        yield Connection()
+    
+    monkeypatch.setattr(data_service, "get_connection", get_connection)
+    return db
+
+
+BASE_WHERE = "title IS NOT NULL AND abstract IS NOT NULL"
+FILTER_COLUMNS = {'study_codes': 'codes', 'phase_codes': 'codes', 'pharma_groups': 'pharma_groups'}
+
+
+def test_filter_clause_without_filters(service):
+    assert service._filter_clause({}) == (BASE_WHERE, [])
+
+
+@pytest.mark.parametrize("keys", [
+    keys for size in range(1, 4) for keys in itertools.combinations(FILTER_COLUMNS, size)
+], ids=lambda keys: "+".join(keys))
+def test_filter_clause_combinations(service, keys):
+    resolved = {key: [f"{key}-value"] for key in keys}
+    where, params = service._filter_clause(resolved)
+    # Study and phase codes both live in the codes column, each ANDed on its own
+    assert where == " AND ".join([BASE_WHERE] + [f"{FILTER_COLUMNS[key]} && %s::text[]" for key in keys])
+    assert params == [[f"{key}-value"] for key in keys]
+
+
+def test_filter_clause_empty_selection_matches_nothing(service):
+    # e.g. a study type label that selects no code: codes && '{}' is never true
+    where, params = service._filter_clause({'study_codes': [], 'pharma_groups': ('Medical Affairs',)})
+    assert where == f"{BASE_WHERE} AND codes && %s::text[] AND pharma_groups && %s::text[]"
+    assert params == [[], ['Medical Affairs']]
+
+
+def test_query_papers(service, database):
+    database.rows = [{'work_id': 'w1'}]
+    rows = service.query_papers({'phase_codes': ['P2']}, offset=30, limit=15)
+    
+    assert rows == [{'work_id': 'w1'}]
+    query, params = database.executed[0]
+    assert f"WHERE {BASE_WHERE} AND codes && %s::text[]" in query
+    assert "ORDER BY publication_year DESC, work_id LIMIT %s OFFSET %s" in query
+    assert params == [['P2'], 15, 30]
+    # Named, i.e. server-side, cursor
+    assert database.cursors[0]['name']
+
+
+def test_count_papers(service, database):
+    database.rows = [(42,)]
+    assert service.count_papers({'pharma_groups': ['Oncology']}) == 42
+    assert database.executed == [
+        (f"SELECT COUNT(*) FROM ibd_rcts WHERE {BASE_WHERE} AND pharma_groups && %s::text[]", [['Oncology']])
+    ]
+
+
+def test_get_filter_values(service, database):
+    database.rows = [('RCT', 'code'), ('P2', 'code'), ('Medical Affairs', 'group')]
+    assert service.get_filter_values() == ({'RCT', 'P2'}, {'Medical Affairs'})
+
+
+def test_sql_errors_fall_back_to_empty_results(service, database):
+    database.error = RuntimeError("connection refused")
+    assert service.query_papers({}, 0, 15) == []
+    assert service.count_papers({}) == 0
+    assert service.get_filter_values() == (set(), set())
+
+
+def _authorships():
+    """Edge cases plus a seeded random mix of names, separators and padding"""
+    tokens = ["A", "Bob Smith", " ", ";", ";;", "  ", "\t", ",", "x" * 60, "Ünï"]
+    rng = random.Random(3)
+    mixed = ["".join(rng.choice(tokens) for _ in range(rng.randint(0, 12))) for _ in range(2000)]
+    return [
+        None, "", " ", ";", " ; ;", "Solo", "A;B", " A ; B ;; C ", "A,B",
+        "y" * 200, "y" * 201, "; ".join(["Name"] * 60), ["A; B"],
+    ] + mixed
+
+
+def test_format_authors_matches_parse_authors(service):
+    raw = _authorships()
+    column = np.empty(len(raw), dtype=object)
+    column[:] = raw
+    expected = [service._parse_authors(value) for value in raw]
+    assert service._format_authors(column).tolist() == expected
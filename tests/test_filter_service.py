@@ -0,0 +1,205 @@
+"""
+FilterService tests - scan paths, label resolution and filter semantics
+"""
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.papers import filter_service
+from services.papers.filter_service import PHARMA_GROUPS, PHASES, STUDY_TYPES, FilterService
+from services.papers.output_scanner import NUMBA_AVAILABLE
+
+
+@pytest.fixture(params=["numba", "automaton", "regex"])
+def service(request, monkeypatch):
+    """FilterService on each scan path: Numba kernel, Aho-Corasick, plain regex"""
+    if request.param == "numba" and not NUMBA_AVAILABLE:
+        pytest.skip("numba not installed")
+    if request.param == "automaton" and FilterService._AUTOMATON is None:
+        pytest.skip("pyahocorasick not installed")
+    if request.param != "numba":
+        monkeypatch.setattr(filter_service, "NUMBA_AVAILABLE", False)
+    if request.param == "regex":
+        monkeypatch.setattr(FilterService, "_AUTOMATON", None)
+    return FilterService()
+
+
+def _papers(outputs):
+    """Papers columns holding just the output column"""
+    column = np.empty(len(outputs), dtype=object)
+    column[:] = list(outputs)
+    return {'output': column}
+
+
+def _corpus(n, seed=7):
+    """Seeded outputs mixing known/unknown pairs, quote styles, spacing and noise"""
+    rng = random.Random(seed)
+    codes = [code for code, _, _ in STUDY_TYPES + PHASES] + ["XYZ", "RCTX", "P"]
+    groups = list(PHARMA_GROUPS) + ["Oncology", "Medical"]
+    outputs = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(0, 5)):
+            key, value = rng.choice([("code", rng.choice(codes)), ("group", rng.choice(groups))])
+            q1, q2, q3, q4 = (rng.choice("'\"") for _ in range(4))
+            space = rng.choice(["", " ", "  ", "\n", "\t "])
+            parts.append(f"{{{q1}{key}{q2}:{space}{q3}{value}{q4}}}")
+            if rng.random() < 0.2:
+                parts.append(rng.choice(["noise", "'code'", "'group': ", "\"code\":"]))
+        outputs.append(", ".join(parts) if parts or rng.random() < 0.5 else None)
+    return outputs
+
+
+def _baseline_rows(outputs, filters):
+    """Rows the pre-vectorization filter kept: one regex per selected code or group.
+    
+    Labels select codes by word-bounded keyword, so "Phase II" does not
+    also select P1 as the old substring check did.
+    """
+    def pattern(key, value):
+        return r"['\"]" + key + r"['\"]:\s*['\"]" + re.escape(value) + r"['\"]"
+    
+    def selected(entries, labels):
+        return [code for code, _, keyword in entries
+                if any(re.search(r"\b" + re.escape(keyword) + r"\b", label) for label in labels)]
+    
+    conditions = []
+    if filters.get('study_types'):
+        conditions.append([pattern("code", code) for code in selected(STUDY_TYPES, filters['study_types'])])
+    if filters.get('phases'):
+        conditions.append([pattern("code", code) for code in selected(PHASES, filters['phases'])])
+    if filters.get('pharma_groups'):
+        conditions.append([pattern("group", group) for group in filters['pharma_groups']])
+    
+    return [
+        row for row, output in enumerate(outputs)
+        if all(any(re.search(p, output or '') for p in patterns) for patterns in conditions)
+    ]
+
+
+def test_non_string_outputs(service):
+    # json/jsonb columns come back from the driver as lists and dicts
+    papers = _papers([
+        [{'code': 'RCT'}, {'group': 'Medical Affairs'}],
+        {'code': 'P2', 'group': 'Oncology'},
+        None,
+        "{'code': 'RCT'}",
+        12,
+    ])
+
+    assert service.apply_filters(papers, {'study_types': ['RCT']}).tolist() == [0, 3]
+    assert service.apply_filters(papers, {'pharma_groups': ['Oncology']}).tolist() == [1]
+    assert service.get_filter_options(papers) == {
+        "study_types": ["Randomized Controlled Trial (RCT)"],
+        "phases": ["Phase II (P2)"],
+        "pharma_groups": ["Medical Affairs"],
+    }
+
+
+def test_labels_select_codes_word_bounded():
+    service = FilterService()
+    assert service.resolve_filters({'phases': ['Phase II (P2)']}) == {'phase_codes': ['P2']}
+    assert service.resolve_filters({'phases': ['Phase I (P1)', 'Phase IV (P4)']}) == {'phase_codes': ['P1', 'P4']}
+    assert service.resolve_filters({'study_types': ['Case Series (CS)']}) == {'study_codes': ['CS']}
+    assert service.resolve_filters({'study_types': ['Unknown']}) == {'study_codes': []}
+    
+    papers = _papers(["{'code': 'P1'}", "{'code': 'P2'}", "{'code': 'P3'}"])
+    assert service.apply_filters(papers, {'phases': ['Phase II (P2)']}).tolist() == [1]
+
+
+def test_apply_filters_matches_baseline(service):
+    outputs = _corpus(1500)
+    papers = _papers(outputs)
+    rng = random.Random(11)
+    study_labels = [label for _, label, _ in STUDY_TYPES] + ["Unknown"]
+    phase_labels = [label for _, label, _ in PHASES]
+    group_labels = list(PHARMA_GROUPS) + ["Oncology", "Medical"]
+    
+    for _ in range(40):
+        filters = {}
+        for name, labels in (('study_types', study_labels), ('phases', phase_labels), ('pharma_groups', group_labels)):
+            if rng.random() < 0.6:
+                filters[name] = rng.sample(labels, rng.randint(1, 3))
+        rows = service.apply_filters(papers, filters, version=1)
+        assert rows.tolist() == _baseline_rows(outputs, filters), filters
+
+
+@pytest.mark.skipif(FilterService._AUTOMATON is None, reason="pyahocorasick not installed")
+def test_automaton_scan_matches_regex_scan(monkeypatch):
+    outputs = [output or '' for output in _corpus(1500, seed=5)]
+    service = FilterService()
+    expected = [service._scan(output) for output in outputs]
+    monkeypatch.setattr(FilterService, "_AUTOMATON", None)
+    assert [service._scan(output) for output in outputs] == expected
+
+
+def test_filter_options_match_baseline(service):
+    outputs = _corpus(800, seed=9)
+    expected = {
+        "study_types": sorted(label for _, label, _ in STUDY_TYPES if _baseline_rows(outputs, {'study_types': [label]})),
+        "phases": sorted(label for _, label, _ in PHASES if _baseline_rows(outputs, {'phases': [label]})),
+        "pharma_groups": sorted(group for group in PHARMA_GROUPS if _baseline_rows(outputs, {'pharma_groups': [group]})),
+    }
+    assert service.get_filter_options(_papers(outputs), version=1) == expected
+
+
+def test_row_bits_computed_once_per_version(monkeypatch):
+    service = FilterService()
+    calls = []
+    compute_bits = service._compute_bits
+    monkeypatch.setattr(service, "_compute_bits", lambda outputs: calls.append(1) or compute_bits(outputs))
+    papers = _papers(["{'code': 'RCT'}", "{'code': 'P2'}"])
+    
+    service.get_filter_options(papers, version=1)
+    assert service.apply_filters(papers, {'study_types': ['RCT']}, version=1).tolist() == [0]
+    assert service.apply_filters(papers, {'phases': ['Phase II (P2)']}, version=1).tolist() == [1]
+    assert len(calls) == 1
+    
+    papers = _papers(["{'code': 'P2'}"])
+    assert service.apply_filters(papers, {'phases': ['Phase II (P2)']}, version=2).tolist() == [0]
+    assert len(calls) == 2
+
+
+def test_row_bits_scanned_once_under_concurrency(monkeypatch):
+    service = FilterService()
+    calls = []
+    compute_bits = service._compute_bits
+    
+    def slow_compute_bits(outputs):
+        calls.append(1)
+        time.sleep(0.05)
+        return compute_bits(outputs)
+    
+    monkeypatch.setattr(service, "_compute_bits", slow_compute_bits)
+    papers = _papers(_corpus(200))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda _: service.apply_filters(papers, {'study_types': ['RCT']}, version=1).tolist(), range(8)
+        ))
+    assert len(calls) == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_filter_options_round_trip_through_resolve_filters():
+    service = FilterService()
+    codes = {code for code, _, _ in STUDY_TYPES + PHASES}
+    options = service.build_filter_options(codes, set(PHARMA_GROUPS) | {"Oncology"})
+    
+    # Every offered label selects exactly its own code
+    for entries, name, slot in ((STUDY_TYPES, 'study_types', 'study_codes'), (PHASES, 'phases', 'phase_codes')):
+        assert sorted(options[name]) == sorted(label for _, label, _ in entries)
+        for code, label, _ in entries:
+            assert service.resolve_filters({name: [label]}) == {slot: [code]}
+    
+    # Unlisted groups are not offered; requested groups pass through verbatim
+    assert options['pharma_groups'] == sorted(PHARMA_GROUPS)
+    assert service.resolve_filters({'pharma_groups': ['Oncology']}) == {'pharma_groups': ['Oncology']}
+    
+    # Only codes present in the data are offered
+    options = service.build_filter_options({'RCT', 'P3', 'XYZ'}, set())
+    assert options == {"study_types": ["Randomized Controlled Trial (RCT)"], "phases": ["Phase III (P3)"], "pharma_groups": []}
+    assert service.resolve_filters({}) == {}
@@ -0,0 +1,96 @@
+"""
+Output scanner tests - the Numba kernel must agree with the regex scan
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from services.papers import filter_service
+from services.papers.filter_service import FilterService, KNOWN_PAIRS, PAIR_BITS, _PAIR_RE
+from services.papers.output_scanner import NUMBA_AVAILABLE, _UNICODE_SPACES, scan_pairs
+
+OUTPUTS = [
+    # Quote variants around key and value
+    "{'code': 'RCT'}",
+    '{"code": "RCT"}',
+    "{'code\": \"P3'}",
+    "{\"group\": 'Medical Affairs'}",
+    # Whitespace and newlines after the colon
+    "{'code':'P1'}",
+    "{'code':\t\t'P2'}",
+    "{'code':\n  'COH'}",
+    "{'group': \r\n 'HEOR (Health Economics)'}",
+    # Non-ASCII and control-range \s separators; U+200B is not whitespace
+    "{'code':\xa0'RCT'}",
+    "{'code':\x1c\x1f'P1'}",
+    "{'code': \u3000\u2003\x85'CS'}",
+    "{'group':\u2028'Pharmacovigilance'}",
+    "{'code':\u200b'SR'}",
+    "{'code':\xa0",
+    # Several pairs, repeats and unknown values
+    "[{'code': 'SR'}, {'code': 'MA'}, {'code': 'SR'}, {'code': 'XYZ'}]",
+    "{'code': 'RCTX', 'group': 'Medical'}",
+    "{'group': 'Clinical Development / R&D', 'code': 'P4'}",
+    # Non-ASCII text before the pair shifts byte offsets
+    "{'note': 'Crohn’s disease – é', 'code': 'CCS'}",
+    # Empty and missing outputs
+    "",
+    None,
+    # Values cut off at the end of the buffer
+    "{'code': 'RCT",
+    "{'code': 'RC",
+    "{'code': '",
+    "{'code': ",
+    "{'code':",
+    "{'code'",
+    "{'cod",
+]
+
+
+def _regex_bits(outputs):
+    """Reference bits: _PAIR_RE over each output"""
+    bits = np.zeros(len(outputs), dtype=np.uint32)
+    for row, output in enumerate(outputs):
+        for match in _PAIR_RE.finditer(output or ''):
+            bits[row] |= PAIR_BITS.get((match.group(1), match.group(2)), np.uint32(0))
+    return bits
+
+
+@pytest.fixture(params=[True, False], ids=["automaton", "regex"])
+def service(request, monkeypatch):
+    if request.param and FilterService._AUTOMATON is None:
+        pytest.skip("pyahocorasick not installed")
+    if not request.param:
+        monkeypatch.setattr(FilterService, "_AUTOMATON", None)
+    return FilterService()
+
+
+def _python_bits(service, monkeypatch):
+    """Bits from the pure-Python scan, bypassing the Numba kernel"""
+    with monkeypatch.context() as patch:
+        patch.setattr(filter_service, "NUMBA_AVAILABLE", False)
+        return service._compute_bits(OUTPUTS)
+
+
+def test_python_scan_matches_regex(service, monkeypatch):
+    np.testing.assert_array_equal(_python_bits(service, monkeypatch), _regex_bits(OUTPUTS))
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba not installed")
+def test_scan_pairs_matches_regex():
+    outputs = [output or '' for output in OUTPUTS]
+    weights = np.array(list(PAIR_BITS.values()), dtype=np.uint32)
+    bits = scan_pairs(outputs, KNOWN_PAIRS).astype(np.uint32) @ weights
+    np.testing.assert_array_equal(bits, _regex_bits(OUTPUTS))
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba not installed")
+def test_scan_pairs_matches_python_scan(service, monkeypatch):
+    np.testing.assert_array_equal(service._compute_bits(OUTPUTS), _python_bits(service, monkeypatch))
+
+
+
+def test_unicode_spaces_match_regex_whitespace():
+    spaces = {chr(c) for c in range(128, sys.maxunicode + 1) if chr(c).isspace()}
+    assert set(_UNICODE_SPACES) == spaces
@@ -0,0 +1,45 @@
+"""
+Route tests - cache invalidation endpoint
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from api.papers import routes
+from app import app
+
+URL = "/api/papers/cache/invalidate"
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def invalidations(monkeypatch):
+    calls = []
+    monkeypatch.setattr(routes.data_service, "invalidate_cache", lambda: calls.append(1))
+    return calls
+
+
+def test_invalidate_disabled_without_admin_token(client, invalidations, monkeypatch):
+    monkeypatch.delenv("CACHE_ADMIN_TOKEN", raising=False)
+    assert client.post(URL).status_code == 404
+    assert client.post(URL, headers={"X-Admin-Token": "anything"}).status_code == 404
+    assert not invalidations
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": ""}, {"X-Admin-Token": "wrong"}],
+                         ids=["missing", "empty", "wrong"])
+def test_invalidate_rejects_bad_token(client, invalidations, monkeypatch, headers):
+    monkeypatch.setenv("CACHE_ADMIN_TOKEN", "s3cret")
+    assert client.post(URL, headers=headers).status_code == 403
+    assert not invalidations
+
+
+def test_invalidate_with_admin_token(client, invalidations, monkeypatch):
+    monkeypatch.setenv("CACHE_ADMIN_TOKEN", "s3cret")
+    response = client.post(URL, headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json() == {"status": "invalidated"}
+    assert len(invalidations) == 1